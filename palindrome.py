@@ -11,14 +11,33 @@ Description:
         - A SA NDoH-aligned recommendation & treatment plan
 
 Usage:
-    python risk_engine.py palindrome_data.txt
+    python risk_engine.py [--no-raw-sentiments] palindrome_data.txt [more_transcripts.txt ...]
+
+Output (<transcript>.analysis.json):
+    scores, matches, urgent, sentiment_trend, raw_sentiments.
+    --no-raw-sentiments leaves out the per-message raw_sentiments list,
+    so memory stays flat on very long transcripts.
+
+Optional:
+    pip install pyahocorasick
+    Keyword matching then runs as a single automaton pass per message,
+    linear in message length regardless of how many phrases are
+    configured. Without it, a substring/regex fallback is used.
 """
 
 import sys
 import re
 import json
-from collections import Counter, defaultdict
-from statistics import mean
+import argparse
+from array import array
+from collections import Counter, defaultdict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+try:
+    import ahocorasick  # optional: pip install pyahocorasick
+except ImportError:
+    ahocorasick = None
 
 # ---------------------------------------------------------
 #                CONFIGURABLE KEYWORD MODELS
@@ -74,10 +93,76 @@ URGENT_PHRASES = [
     "self harm", "hurt myself", "rape", "sexual assault"
 ]
 
+# urgent phrases that escalate the mental-health plan to CRITICAL
+CRITICAL_URGENT = frozenset({"suicide", "kill myself", "self harm", "hurt myself"})
+
 SENTIMENT_POS = ["good", "okay", "fine", "better", "improving", "relieved"]
 SENTIMENT_NEG = ["sad", "bad", "angry", "upset", "scared", "worried", "hopeless"]
 
 
+# ---------------------------------------------------------
+#                  KEYWORD SCANNING AUTOMATON
+# ---------------------------------------------------------
+
+KeywordTable = namedtuple("KeywordTable", [
+    "phrases", "hiv_pts", "mental_pts", "urgent_flags", "ids", "lens",
+    "automaton", "scored_re", "urgent_re"
+])
+
+
+def keyword_table(hiv_keywords=HIV_KEYWORDS, mental_keywords=MENTAL_KEYWORDS,
+                  urgent_phrases=URGENT_PHRASES):
+    """
+    Flatten the keyword models into parallel arrays indexed by phrase id:
+    phrases[i], hiv_pts[i], mental_pts[i], urgent_flags[i], lens[i]
+    (0 where the phrase is not part of that model), plus every matcher
+    built from them. Phrases are interned so every match counter shares
+    the same key objects.
+    """
+    phrases = tuple(dict.fromkeys(
+        sys.intern(p) for p in [*hiv_keywords, *mental_keywords, *urgent_phrases]
+    ))
+    hiv_pts = array("h", (hiv_keywords.get(p, 0) for p in phrases))
+    mental_pts = array("h", (mental_keywords.get(p, 0) for p in phrases))
+    urgent_flags = array("b", (p in urgent_phrases for p in phrases))
+
+    # regex fallback when pyahocorasick is not installed: the lookahead
+    # tries every position and, with alternatives longest-first, yields
+    # the longest scored phrase starting there
+    scored_re = re.compile("(?=(%s))" % "|".join(
+        re.escape(p) for p in sorted(
+            (p for i, p in enumerate(phrases) if hiv_pts[i] or mental_pts[i]),
+            key=len, reverse=True
+        )
+    ))
+    # lookahead as well, so overlapping urgent phrases ("kill myself harm")
+    # are all flagged
+    urgent_re = re.compile("(?=(%s))" % "|".join(re.escape(p) for p in urgent_phrases))
+
+    return KeywordTable(
+        phrases=phrases,
+        hiv_pts=hiv_pts,
+        mental_pts=mental_pts,
+        urgent_flags=urgent_flags,
+        ids={phrase: i for i, phrase in enumerate(phrases)},
+        lens=array("h", map(len, phrases)),
+        automaton=build_automaton(phrases) if ahocorasick else None,
+        scored_re=scored_re,
+        urgent_re=urgent_re
+    )
+
+
+def build_automaton(phrases):
+    A = ahocorasick.Automaton()
+    for i, phrase in enumerate(phrases):
+        A.add_word(phrase, i)
+    A.make_automaton()
+    return A
+
+
+KEYWORDS = keyword_table()
+
+
 # ---------------------------------------------------------
 #                        HELPERS
 # ---------------------------------------------------------
@@ -86,100 +171,191 @@ def clean(text):
     return text.lower().strip()
 
 
+# every line boundary str.splitlines() recognises, not just "\n"
+LINE_SEP = r"\n\r\x0b\x0c\x1c-\x1e\x85\u2028\u2029"
+LINE_RE = re.compile(
+    r"(?:^|(?<=[{sep}]))\[([^\]{sep}]*)\][^\S{sep}]*([^:{sep}]*):[^\S{sep}]*([^{sep}]*)(?=[{sep}]|\Z)"
+    .format(sep=LINE_SEP)
+)
+
+
+def to_message(m):
+    return {
+        "timestamp": m.group(1),
+        "speaker": sys.intern(m.group(2)),
+        "message": m.group(3).strip()
+    }
+
+
 def parse_conversation(text):
     """
     Expected format:
     [DD/MM/YYYY, HH:MM] Name: Message
     """
-    pattern = re.compile(r'^\[(.*?)\]\s*(.*?):\s*(.*)$')
-    messages = []
-
-    for line in text.splitlines():
-        m = pattern.match(line)
-        if m:
-            messages.append({
-                "timestamp": m.group(1),
-                "speaker": m.group(2),
-                "message": m.group(3).strip()
-            })
-    return messages
+    return [to_message(m) for m in LINE_RE.finditer(text)]
+
 
+def iter_conversation(lines):
+    """
+    Streaming parse_conversation: yields messages from any iterable of
+    lines (e.g. an open file) without holding the transcript in memory.
+    """
+    match = LINE_RE.match
+    for line in lines:
+        # file iteration only breaks on "\n"; honour the other splitlines()
+        # boundaries within each chunk as well
+        for record in line.splitlines():
+            m = match(record)
+            if m:
+                yield to_message(m)
 
-def score_keywords(text, model):
-    score = 0
-    matches = Counter()
-    t = clean(text)
 
-    for phrase, pts in sorted(model.items(), key=lambda x: -len(x[0])):
-        if phrase in t:
-            score += pts
-            matches[phrase] += 1
+NO_HITS = (0, 0, (), ())
 
-    return score, matches
 
+def score_keywords(t, table=KEYWORDS, fallback=False):
+    """
+    Scan a clean()ed message once for every HIV, mental-health and urgent
+    phrase in table. Where several phrases start at the same position only
+    the longest scores ("panic attack", not also "panic"); urgent phrases
+    are always flagged. The regex matchers are used when fallback is set
+    or pyahocorasick is not installed. Results are cached by
+    score_message, so they are returned as tuples:
+    (hiv points, mental points, ((phrase id, count), ...), (urgent phrase, ...))
+    """
+    ids_of, hiv_pts, mental_pts = table.ids, table.hiv_pts, table.mental_pts
 
-def sentiment_score(text):
-    t = clean(text)
-    pos = sum(1 for w in SENTIMENT_POS if w in t)
-    neg = sum(1 for w in SENTIMENT_NEG if w in t)
+    if fallback or table.automaton is None:
+        ids = [ids_of[mo.group(1)] for mo in table.scored_re.finditer(t)]
+        urgent_ids = [ids_of[mo.group(1)] for mo in table.urgent_re.finditer(t)]
+    else:
+        # matches arrive ordered by end index, so for a given start
+        # position the last one seen is the longest; urgent-only phrases
+        # carry no points and must not hide a scored one (as in scored_re)
+        lens, urgent_flags = table.lens, table.urgent_flags
+        longest = {}
+        urgent_ids = []
+        for end, i in table.automaton.iter(t):
+            if hiv_pts[i] or mental_pts[i]:
+                longest[end - lens[i]] = i
+            if urgent_flags[i]:
+                urgent_ids.append(i)
+        ids = longest.values()
+
+    if not ids and not urgent_ids:
+        return NO_HITS
+
+    hits = Counter(ids)
+    hiv = mental = 0
+    for i, n in hits.items():
+        hiv += hiv_pts[i] * n
+        mental += mental_pts[i] * n
+    urgent = dict.fromkeys(table.phrases[i] for i in urgent_ids)
+
+    return hiv, mental, tuple(hits.items()), tuple(urgent)
+
+
+TOKEN_RE = re.compile(r"\w+")
+SENTIMENT_POS_WORDS = frozenset(SENTIMENT_POS)
+SENTIMENT_NEG_WORDS = frozenset(SENTIMENT_NEG)
+
+
+def sentiment_score(t):
+    """
+    Expects clean()ed text. Counts whole-word hits, so "goodness" no
+    longer scores as "good".
+    """
+    tokens = TOKEN_RE.findall(t)
+    pos = sum(map(SENTIMENT_POS_WORDS.__contains__, tokens))
+    neg = sum(map(SENTIMENT_NEG_WORDS.__contains__, tokens))
     return pos - neg
 
 
+@lru_cache(maxsize=4096)
+def score_message(msg):
+    """
+    Cached by the raw message, so repeated messages skip lower-casing as
+    well as scoring. Returns (sentiment, *score_keywords(...)).
+    """
+    t = clean(msg)
+    return (sentiment_score(t),) + score_keywords(t)
+
+
 # ---------------------------------------------------------
 #                    CORE ANALYSIS ENGINE
 # ---------------------------------------------------------
 
-def analyse(messages):
+def analyse(messages, raw_sentiments=True):
+    """
+    Only the first and last five sentiments are needed for the trend;
+    pass raw_sentiments=False to skip keeping the full per-message history
+    (and leave it out of the result) on very long transcripts.
+    """
     hiv_total = 0
     mh_total = 0
-    hiv_matches = Counter()
-    mh_matches = Counter()
+    hiv_matches = defaultdict(int)
+    mh_matches = defaultdict(int)
     urgent = []
 
-    sentiment_history = []
+    first5 = []
+    last5 = deque(maxlen=5)
+    sentiment_history = [] if raw_sentiments else None
+
+    # hot loop: bind globals to locals
+    phrases, hiv_pts, mental_pts = KEYWORDS.phrases, KEYWORDS.hiv_pts, KEYWORDS.mental_pts
+    score = score_message
 
     for m in messages:
         msg = m["message"]
+        s, h_s, m_s, hits, urgent_phrases = score(msg)
 
         # sentiment
-        sentiment_history.append(sentiment_score(msg))
-
-        # keyword scoring
-        h_s, h_m = score_keywords(msg, HIV_KEYWORDS)
-        m_s, m_m = score_keywords(msg, MENTAL_KEYWORDS)
+        if len(first5) < 5:
+            first5.append(s)
+        last5.append(s)
+        if sentiment_history is not None:
+            sentiment_history.append(s)
 
+        # keyword scoring + urgent flags, one pass
         hiv_total += h_s
         mh_total += m_s
-        hiv_matches.update(h_m)
-        mh_matches.update(m_m)
-
-        # urgent flags
-        for u in URGENT_PHRASES:
-            if u in clean(msg):
-                urgent.append({
-                    "phrase": u,
-                    "timestamp": m["timestamp"],
-                    "speaker": m["speaker"],
-                    "message": msg
-                })
+        for i, n in hits:
+            if hiv_pts[i]:
+                hiv_matches[phrases[i]] += n
+            if mental_pts[i]:
+                mh_matches[phrases[i]] += n
+
+        for u in urgent_phrases:
+            urgent.append({
+                "phrase": u,
+                "timestamp": m["timestamp"],
+                "speaker": m["speaker"],
+                "message": msg
+            })
 
     # normalize to 0–100 scale
     hiv_score = min(100, int((hiv_total / 120) * 100))
     mh_score = min(100, int((mh_total / 120) * 100))
 
+    # average of the first vs last five messages (empty transcript -> Stable)
+    first_avg = sum(first5) / len(first5) if first5 else 0
+    last_avg = sum(last5) / len(last5) if last5 else 0
+
     trend = (
-        "Improving" if mean(sentiment_history[-5:]) > mean(sentiment_history[:5])
-        else "Worsening" if mean(sentiment_history[-5:]) < mean(sentiment_history[:5])
+        "Improving" if last_avg > first_avg
+        else "Worsening" if last_avg < first_avg
         else "Stable"
     )
 
-    return {
+    result = {
         "scores": {"hiv": hiv_score, "mental": mh_score},
-        "matches": {"hiv": hiv_matches, "mental": mh_matches},
+        "matches": {"hiv": dict(hiv_matches), "mental": dict(mh_matches)},
         "urgent": urgent,
-        "sentiment_trend": trend,
-        "raw_sentiments": sentiment_history
+        "sentiment_trend": trend
     }
+    if sentiment_history is not None:
+        result["raw_sentiments"] = sentiment_history
+    return result
 
 
 # ---------------------------------------------------------
@@ -214,7 +390,7 @@ def ndoh_recommendations(result):
         )
 
     # Mental — South Africa Mental Health Policy
-    if any(u["phrase"] in ["suicide", "kill myself", "self harm", "hurt myself"] for u in urgent):
+    if any(u["phrase"] in CRITICAL_URGENT for u in urgent):
         recs.append(
             "Mental Health CRITICAL — Follow NDoH 72-hour Emergency Mental-Health policy: "
             "• Immediate safety assessment\n"
@@ -294,25 +470,41 @@ def make_report(path, analysis):
 #                           MAIN
 # ---------------------------------------------------------
 
-def main(path):
+def process(path, raw_sentiments=True):
+    """Analyse one transcript, save its JSON and return the printable output."""
     with open(path, "r", encoding="utf-8") as f:
-        content = f.read()
-
-    messages = parse_conversation(content)
-    analysis = analyse(messages)
+        analysis = analyse(iter_conversation(f), raw_sentiments=raw_sentiments)
     report = make_report(path, analysis)
 
-    print(report)
-
     json_path = path + ".analysis.json"
     with open(json_path, "w", encoding="utf-8") as jf:
-        json.dump(analysis, jf, indent=2)
+        json.dump(analysis, jf, separators=(",", ":"))
+
+    return f"{report}\n\nJSON results saved to: {json_path}"
 
-    print(f"\nJSON results saved to: {json_path}")
+
+def main(path, raw_sentiments=True):
+    print(process(path, raw_sentiments))
+
+
+def main_many(paths, raw_sentiments=True):
+    """
+    Transcripts are independent, so analyse them in parallel worker
+    processes; reports are printed in the order the paths were given.
+    """
+    with ProcessPoolExecutor() as pool:
+        for output in pool.map(process, paths, [raw_sentiments] * len(paths)):
+            print(output)
+            print()
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python risk_engine.py conversation.txt")
-        sys.exit(1)
-    main(sys.argv[1])
+    parser = argparse.ArgumentParser(description="Conversation risk analysis")
+    parser.add_argument("paths", nargs="+", metavar="conversation.txt")
+    parser.add_argument("--no-raw-sentiments", dest="raw_sentiments", action="store_false",
+                        help="leave the per-message raw_sentiments list out of the JSON")
+    args = parser.parse_args()
+    if len(args.paths) == 1:
+        main(args.paths[0], args.raw_sentiments)
+    else:
+        main_many(args.paths, args.raw_sentiments)
@@ -0,0 +1,139 @@
+import random
+
+import pytest
+
+import palindrome
+
+# parity tests compare the automaton against the regex fallback
+needs_automaton = pytest.mark.skipif(palindrome.ahocorasick is None,
+                                     reason="pyahocorasick not installed")
+
+
+CASES = [
+    "",
+    "ok",
+    "sti sti panic attack kill myself harm",
+    "panic attack and panic",
+    "i will hurt myself harm",
+    "unprotected sexual assault",
+    "no condomless sex",
+    "i am suicidal, suicide. suicide",
+    "therapeutic rape",
+]
+
+
+def normalise(result):
+    hiv, mental, hits, urgent = result
+    return hiv, mental, sorted(hits), sorted(urgent)
+
+
+def random_cases(n=2000, seed=0):
+    rng = random.Random(seed)
+    vocab = list(palindrome.KEYWORDS.phrases) + ["harm", "self", "myself", "attack", "i", "a"]
+    for _ in range(n):
+        yield " ".join(rng.choices(vocab, k=rng.randint(1, 6)))
+
+
+@needs_automaton
+@pytest.mark.parametrize("t", CASES)
+def test_backends_agree(t):
+    assert normalise(palindrome.score_keywords(t)) == \
+        normalise(palindrome.score_keywords(t, fallback=True))
+
+
+@needs_automaton
+def test_backends_agree_random():
+    for t in random_cases():
+        assert normalise(palindrome.score_keywords(t)) == \
+            normalise(palindrome.score_keywords(t, fallback=True)), t
+
+
+def test_overlapping_urgent_phrases_all_flagged():
+    for fallback in (False, True):
+        urgent = palindrome.score_keywords("kill myself harm", fallback=fallback)[3]
+        assert sorted(urgent) == ["kill myself", "self harm"]
+
+
+@needs_automaton
+def test_urgent_only_phrase_does_not_hide_scored_phrase():
+    table = palindrome.keyword_table(urgent_phrases=palindrome.URGENT_PHRASES + ["panic now"])
+    t = "panic now"
+    with_automaton = palindrome.score_keywords(t, table)
+    assert normalise(with_automaton) == normalise(palindrome.score_keywords(t, table, fallback=True))
+    assert with_automaton[1] == palindrome.MENTAL_KEYWORDS["panic"]
+
+
+@needs_automaton
+def test_risk_scores_do_not_depend_on_backend(monkeypatch):
+    messages = [{"timestamp": "01/01/2025, 08:00", "speaker": "User",
+                 "message": "sti sti panic attack kill myself harm"}]
+    palindrome.score_message.cache_clear()
+    with_automaton = palindrome.analyse(messages)
+
+    score_keywords = palindrome.score_keywords
+    monkeypatch.setattr(palindrome, "score_keywords",
+                        lambda t: score_keywords(t, fallback=True))
+    palindrome.score_message.cache_clear()
+    without = palindrome.analyse(messages)
+    palindrome.score_message.cache_clear()
+
+    assert with_automaton == without
+    assert with_automaton["matches"]["hiv"] == {"sti": 2}
+
+
+@pytest.mark.parametrize("sep", ["\n", "\r", "\r\n", "\x0b", "\x0c", "\x1c", "\x1d", "\x1e",
+                                 "\x85", "\u2028", "\u2029"])
+def test_parse_conversation_splits_on_every_line_boundary(sep):
+    messages = palindrome.parse_conversation(f"[a] b: c{sep}[d] e: f")
+    assert [(m["timestamp"], m["speaker"], m["message"]) for m in messages] == \
+        [("a", "b", "c"), ("d", "e", "f")]
+
+
+@pytest.mark.parametrize("sep", ["\x0b", "\x0c", "\x1c", "\x85", "\u2028", "\u2029"])
+def test_iter_conversation_matches_parse_conversation(tmp_path, sep):
+    text = f"[a] b: c{sep}[d] e: f\n[g] h: i\n"
+    path = tmp_path / "t.txt"
+    path.write_text(text, encoding="utf-8")
+    with open(path, encoding="utf-8") as f:
+        assert list(palindrome.iter_conversation(f)) == palindrome.parse_conversation(text)
+
+
+def test_matches_do_not_grow_on_lookup():
+    result = palindrome.analyse([{"timestamp": "t", "speaker": "s", "message": "sti"}])
+    assert result["matches"]["hiv"].get("rape") is None
+    with pytest.raises(KeyError):
+        result["matches"]["hiv"]["rape"]
+    assert "rape" not in palindrome.make_report("x", result)
+
+
+def test_raw_sentiments_kept_unless_disabled():
+    messages = [{"timestamp": "t", "speaker": "s", "message": "good"}]
+    assert palindrome.analyse(messages)["raw_sentiments"] == [1]
+    assert "raw_sentiments" not in palindrome.analyse(messages, raw_sentiments=False)
+
+
+def test_sentiment_counts_whole_words_only():
+    assert palindrome.sentiment_score("goodness, what a badge") == 0
+    assert palindrome.sentiment_score("good good but sad") == 1
+
+
+def test_empty_transcript_is_stable():
+    assert palindrome.analyse([])["sentiment_trend"] == "Stable"
+
+
+@pytest.mark.parametrize("fallback", [False, True])
+def test_longest_phrase_wins_at_same_start(fallback):
+    assert palindrome.score_keywords("panic attack", fallback=fallback)[1] == \
+        palindrome.MENTAL_KEYWORDS["panic attack"]
+
+
+def test_critical_urgent_phrase_escalates_plan():
+    result = palindrome.analyse([{"timestamp": "t", "speaker": "s",
+                                  "message": "I want to kill myself"}])
+    assert any(rec.startswith("Mental Health CRITICAL")
+               for rec in palindrome.ndoh_recommendations(result))
+
+    result = palindrome.analyse([{"timestamp": "t", "speaker": "s",
+                                  "message": "I feel hopeless"}])
+    assert not any(rec.startswith("Mental Health CRITICAL")
+                   for rec in palindrome.ndoh_recommendations(result))